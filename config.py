@@ -1,6 +1,15 @@
 import configparser
+import functools
 import os
+import types
 
+# Default locations, built once at import
+_DEFAULT_CREDENTIALS_JSON = os.path.join(os.sep, 'config', 'credentials.json')
+_DEFAULT_TOKEN_JSON = os.path.join(os.sep, 'config', 'token.json')
+_DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'voice-memo-to-doc')
+
+# The environment is read once per env; the result is read-only so callers can share it
+@functools.lru_cache(maxsize=4)
 def load_config(env='development'):
 
     # Load environment variables with defaults
@@ -8,8 +17,10 @@ def load_config(env='development'):
         'OPENAI_ORGANIZATION': os.environ.get('OPENAI_ORGANIZATION', ''),
         'OPENAI_PROJECT': os.environ.get('OPENAI_PROJECT', ''),
         'OPENAI_API_KEY': os.environ.get('OPENAI_API_KEY', ''),
-        'CREDENTIALS_JSON': os.environ.get('CREDENTIALS_JSON', os.path.join(os.sep, 'config', 'credentials.json')),
-        'TOKEN_JSON': os.environ.get('TOKEN_JSON', os.path.join(os.sep, 'config', 'token.json'))
+        'GPT_CLEAN_MODEL': os.environ.get('GPT_CLEAN_MODEL', 'gpt-4o-mini'),
+        'CREDENTIALS_JSON': os.environ.get('CREDENTIALS_JSON', _DEFAULT_CREDENTIALS_JSON),
+        'TOKEN_JSON': os.environ.get('TOKEN_JSON', _DEFAULT_TOKEN_JSON),
+        'CACHE_DIR': os.environ.get('CACHE_DIR', _DEFAULT_CACHE_DIR)
     }
 
-    return config_values
+    return types.MappingProxyType(config_values)
@@ -1,26 +1,66 @@
+from __future__ import annotations
+
+import io
 import os
+import re
+import stat
+import asyncio
 import datetime
+import functools
+import hashlib
+import importlib.util
 import logging
-import textwrap
+import tempfile
+import threading
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import List, Dict, Any
+from typing import TYPE_CHECKING, List, Dict, Any, Mapping, Optional, Tuple
 from pathlib import Path
 
-from openai import OpenAI
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaFileUpload
-
 from config import load_config
 
+# The OpenAI, Google, tiktoken and pydub packages take most of a second to
+# import, so they are loaded where they are first needed rather than here.
+# That keeps --help, argument errors and input validation fast.
+if TYPE_CHECKING:
+    import tiktoken
+    from openai import AsyncOpenAI
+    from google.oauth2.credentials import Credentials
+
 # Constants
 SCOPES = ['https://www.googleapis.com/auth/documents', 'https://www.googleapis.com/auth/drive']
-GPT_CHUNK_SIZE = 2000
+TRANSCRIBE_MODEL = "whisper-1"
+# Bump when the cleanup prompt or chunking changes so cached cleanups are not reused
+CLEAN_PROMPT_VERSION = 2
+# Leaves room for a cleaned copy of each chunk even in GPT-4's 8k context
+GPT_CHUNK_TOKENS = 3000
+# Rough token estimate used when tiktoken is not installed
+CHARS_PER_TOKEN = 4
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+|(?<=[。！？])')
+# Recordings longer than this are split into segments of about SEGMENT_MS
+SPLIT_AUDIO_THRESHOLD_SECONDS = 5 * 60
+SEGMENT_MS = 3 * 60 * 1000
+# Each cut is placed at the quietest point in the window before the target length
+SILENCE_SEARCH_MS = 30 * 1000
+# With --compress, uploads larger than this are transcoded to 16 kHz mono Opus first
+COMPRESS_MIN_BYTES = 1024 * 1024
+OPUS_BITRATE = '16k'
+DEFAULT_CONCURRENCY = 8
+# Retries for transient API failures (429s, 5xx, dropped connections); both
+# SDKs back off exponentially with jitter between attempts
+API_MAX_RETRIES = 5
+# Threads for blocking googleapiclient calls, each with its own HTTP connection
+DOCS_WORKERS = 4
+# os.stat calls in flight at once; each can be a round-trip on network filesystems
+STAT_WORKERS = 16
+CLEAN_CONCURRENCY = 10
+TRANSCRIBE_CONCURRENCY = 8
+# How long before expiry the Google access token is refreshed in the background
+TOKEN_REFRESH_MARGIN = datetime.timedelta(minutes=5)
 DEFAULT_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Characters the Docs API silently drops from insertText
+DOCS_STRIPPED_CHARS = re.compile('[\x00-\x08\x0c-\x1f\ue000-\uf8ff]')
 
 @dataclass
 class ProcessingResult:
@@ -29,86 +69,460 @@ class ProcessingResult:
     doc_id: str
     doc_url: str
 
+class TranscriptCache:
+    """On-disk store of transcription and cleanup results, keyed by a hash of their inputs."""
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = Path(cache_dir).expanduser()
+
+    @staticmethod
+    def key(*parts: str) -> str:
+        return hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        # The cache is best-effort: an unreadable entry is treated as a miss
+        try:
+            return (self.cache_dir / f'{key}.txt').read_text(encoding='utf-8')
+        except FileNotFoundError:
+            return None
+        except (OSError, UnicodeDecodeError) as e:
+            logging.warning('Could not read cache entry %s: %s', key, e)
+            return None
+
+    def put(self, key: str, text: str) -> None:
+        # Write to a temporary file and rename so readers never see a partial entry.
+        # Failures are only logged so a full or read-only disk can't lose a result
+        # that has already been paid for.
+        temp_path = None
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=self.cache_dir,
+                                             suffix='.tmp', delete=False) as f:
+                temp_path = f.name
+                f.write(text)
+            os.replace(temp_path, self.cache_dir / f'{key}.txt')
+        except OSError as e:
+            logging.warning('Could not write cache entry %s: %s', key, e)
+            if temp_path is not None:
+                try:
+                    os.unlink(temp_path)
+                except OSError:
+                    pass
+
 class TranscriptionService:
-    def __init__(self, client: OpenAI):
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        clean_model: str,
+        cache: Optional[TranscriptCache] = None,
+        compress: bool = False
+    ):
         self.client = client
+        self.clean_model = clean_model
+        self.cache = cache
+        self.compress = compress
+        # Shared by every clean_text call so concurrent files stay under the rate limit
+        self._clean_semaphore = asyncio.Semaphore(CLEAN_CONCURRENCY)
+        # Likewise for Whisper uploads, and for decoding long recordings, which
+        # holds the whole file as PCM in memory
+        self._transcribe_semaphore = asyncio.Semaphore(TRANSCRIBE_CONCURRENCY)
         
-    def transcribe(self, audio_file_path: str) -> str:
-        """Transcribe audio file using OpenAI's Whisper model."""
-        logging.info(f'Transcribing {audio_file_path}')
-        with open(audio_file_path, "rb") as audio_file:
-            transcription = self.client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file
+    async def transcribe(self, audio_file_path: str) -> str:
+        """Transcribe audio file using OpenAI's Whisper model.
+
+        Long recordings are split at quiet points and the segments are
+        transcribed concurrently. With ``compress`` set, audio is transcoded
+        to Opus before upload to cut transfer time.
+        """
+        logging.info('Transcribing %s', audio_file_path)
+        audio_path = Path(audio_file_path)
+        # Read, hash and decode in worker threads so large memos don't stall the event loop
+        audio_data = await asyncio.to_thread(audio_path.read_bytes)
+        if self.cache:
+            digest = await asyncio.to_thread(hashlib.sha256, audio_data)
+            # Lossy Opus uploads can transcribe differently, so they are cached apart
+            variant = 'opus' if self.compress else 'raw'
+            cache_key = TranscriptCache.key('transcribe', TRANSCRIBE_MODEL, variant, digest.hexdigest())
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logging.info('Using cached transcription for %s', audio_file_path)
+                return cached
+
+        async with self._transcribe_semaphore:
+            segments = await asyncio.to_thread(_split_audio, audio_path, self.compress)
+        if segments is None:
+            upload = (audio_path.name, audio_data)
+            if self.compress and len(audio_data) > COMPRESS_MIN_BYTES:
+                compressed = await _transcode_to_opus(audio_path)
+                if compressed is not None:
+                    logging.debug('Compressed %s from %d to %d bytes', audio_file_path, len(audio_data), len(compressed))
+                    upload = (f'{audio_path.stem}.ogg', compressed)
+            text = await self._transcribe_upload(*upload)
+        else:
+            logging.debug('Split %s into %d segments', audio_file_path, len(segments))
+            texts = await _gather_all(*[
+                self._transcribe_upload(file_name, segment)
+                for file_name, segment in segments
+            ])
+            text = ' '.join(texts)
+        logging.info('Transcribed %s', audio_file_path)
+
+        if self.cache:
+            self.cache.put(cache_key, text)
+        return text
+
+    async def _transcribe_upload(self, file_name: str, audio_data: bytes) -> str:
+        async with self._transcribe_semaphore:
+            transcription = await self.client.audio.transcriptions.create(
+                model=TRANSCRIBE_MODEL,
+                file=(file_name, audio_data)
             )
-        logging.info(f'Transcribed {audio_file_path}')
         return transcription.text
 
-    def clean_text(self, text: str) -> str:
-        """Clean and format transcribed text using GPT-4."""
-        logging.debug(f'Cleaning text')
-        chunks = textwrap.wrap(text, GPT_CHUNK_SIZE)
-        cleaned_chunks = []
+    async def clean_text(self, text: str) -> str:
+        """Clean and format transcribed text using the configured chat model."""
+        logging.debug('Cleaning text')
+        if self.cache:
+            cache_key = TranscriptCache.key('clean', self.clean_model, str(CLEAN_PROMPT_VERSION), text)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logging.debug('Using cached cleanup')
+                return cached
 
-        for chunk in chunks:
+        # Loading the tokenizer (a download on first use) and tokenizing both block,
+        # so keep them off the event loop
+        chunks = await asyncio.to_thread(
+            lambda: _chunk_text(text, GPT_CHUNK_TOKENS, _encoding_for(self.clean_model)))
+        cleaned_chunks = await _gather_all(*[self._clean_chunk(chunk) for chunk in chunks])
+        cleaned = '\n'.join(cleaned_chunks)
+
+        if self.cache:
+            self.cache.put(cache_key, cleaned)
+        return cleaned
+
+    async def _clean_chunk(self, chunk: str) -> str:
+        """Clean a single chunk of transcribed text."""
+        async with self._clean_semaphore:
             try:
-                response = self.client.chat.completions.create(
-                    model="gpt-4",
+                stream = await self.client.chat.completions.create(
+                    model=self.clean_model,
                     messages=[
                         {"role": "system", "content": "You are a helpful assistant who cleans up and formats transcriptions."},
                         {"role": "user", "content": f"Please clean up the following transcription by fixing any misspellings, adding line breaks, paragraph breaks, and appropriate punctuation:\n\n{chunk}"}
-                    ]
+                    ],
+                    stream=True
                 )
-                cleaned_chunks.append(response.choices[0].message.content)
+                parts = []
+                async for event in stream:
+                    if event.choices:
+                        parts.append(event.choices[0].delta.content or '')
             except Exception as e:
-                logging.error(f'Failed to clean text chunk: {e}')
+                logging.error('Failed to clean text chunk: %s', e)
                 raise
 
-        return '\n'.join(cleaned_chunks)
+        return ''.join(parts)
+
+def _split_audio(audio_path: Path, compress: bool = False) -> Optional[List[Tuple[str, bytes]]]:
+    """Split a long recording into named segments, cutting where it is quietest.
+
+    Segments are FLAC, or Opus when ``compress`` is set. Returns None when the
+    recording is short enough to upload as is, or when pydub/ffmpeg are
+    unavailable.
+    """
+    try:
+        from pydub import AudioSegment
+        from pydub.utils import mediainfo
+    except ImportError:
+        # Optional: without pydub, long recordings are uploaded in one piece
+        return None
+
+    try:
+        duration = float(mediainfo(str(audio_path)).get('duration', 0))
+        if duration <= SPLIT_AUDIO_THRESHOLD_SECONDS:
+            return None
+        # Whisper works at 16 kHz mono, so nothing is lost by downmixing first
+        audio = AudioSegment.from_file(str(audio_path)).set_channels(1).set_frame_rate(16000)
+    except Exception as e:
+        logging.warning('Could not split %s, uploading it whole: %s', audio_path, e)
+        return None
+
+    cuts = [0]
+    while len(audio) - cuts[-1] > SEGMENT_MS:
+        target = cuts[-1] + SEGMENT_MS
+        # Cut in the middle of the quietest 100 ms slice in the search window
+        quietest = min(range(target - SILENCE_SEARCH_MS, target, 100),
+                       key=lambda start: audio[start:start + 100].rms)
+        cuts.append(quietest + 50)
+    cuts.append(len(audio))
+
+    def export(extension: str, **options) -> List[Tuple[str, bytes]]:
+        segments = []
+        for index, (start, end) in enumerate(zip(cuts, cuts[1:])):
+            buffer = io.BytesIO()
+            audio[start:end].export(buffer, **options)
+            segments.append((f'{audio_path.stem}-{index}.{extension}', buffer.getvalue()))
+        return segments
+
+    if compress:
+        try:
+            return export('ogg', format='ogg', codec='libopus', bitrate=OPUS_BITRATE)
+        except Exception as e:
+            # e.g. an ffmpeg built without libopus
+            logging.warning('Could not encode %s segments as Opus, using FLAC: %s', audio_path, e)
+    try:
+        return export('flac', format='flac')
+    except Exception as e:
+        logging.warning('Could not split %s, uploading it whole: %s', audio_path, e)
+        return None
+
+async def _transcode_to_opus(audio_path: Path) -> Optional[bytes]:
+    """Transcode a recording to 16 kHz mono Opus with ffmpeg, or return None if that fails."""
+    try:
+        process = await asyncio.create_subprocess_exec(
+            'ffmpeg', '-nostdin', '-loglevel', 'error', '-i', str(audio_path),
+            '-ac', '1', '-ar', '16000', '-c:a', 'libopus', '-b:a', OPUS_BITRATE, '-f', 'ogg', 'pipe:1',
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        stdout, stderr = await process.communicate()
+    except OSError as e:
+        logging.warning('Could not run ffmpeg, uploading %s uncompressed: %s', audio_path, e)
+        return None
+    if process.returncode != 0:
+        logging.warning('ffmpeg failed, uploading %s uncompressed: %s',
+                        audio_path, stderr.decode(errors='replace').strip())
+        return None
+    return stdout
+
+@functools.lru_cache(maxsize=None)
+def _encoding_for(model: str) -> Optional[tiktoken.Encoding]:
+    """Return the tokenizer for a chat model, loading each one only once.
+
+    Returns None when tiktoken is not installed.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding('o200k_base')
+
+def _count_tokens(text: str, encoding: Optional[tiktoken.Encoding]) -> int:
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text))
+
+def _chunk_text(text: str, max_tokens: int, encoding: Optional[tiktoken.Encoding]) -> List[str]:
+    """Pack sentences into chunks of at most max_tokens tokens.
+
+    Sentences longer than max_tokens are split between words, and words
+    longer than that are cut into slices. Pieces keep the separator that
+    preceded them, so text without spaces (e.g. Chinese or Japanese) is not
+    given any. Without an encoding, tokens are estimated from the character
+    count.
+    """
+    pieces = []
+    for separator, sentence in _split_sentences(text.strip()):
+        if _count_tokens(sentence, encoding) <= max_tokens:
+            pieces.append((separator, sentence))
+            continue
+        words = re.split(r'(\s+)', sentence)
+        for word_separator, word in zip([separator] + words[1::2], words[0::2]):
+            if not word:
+                continue
+            for index, part in enumerate(_split_oversized(word, max_tokens, encoding)):
+                pieces.append((word_separator if index == 0 else '', part))
+
+    chunks = []
+    current = ''
+    current_tokens = 0
+    for separator, piece in pieces:
+        tokens = _count_tokens(piece, encoding)
+        cost = tokens + (_count_tokens(separator, encoding) if current else 0)
+        if current and current_tokens + cost > max_tokens:
+            chunks.append(current)
+            current = ''
+            current_tokens = 0
+            cost = tokens
+        current = current + separator + piece if current else piece
+        current_tokens += cost
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _split_sentences(text: str) -> List[Tuple[str, str]]:
+    """Split text into (preceding separator, sentence) pairs."""
+    sentences = []
+    separator = ''
+    position = 0
+    for match in SENTENCE_BOUNDARY.finditer(text):
+        sentence = text[position:match.start()]
+        if sentence:
+            sentences.append((separator, sentence))
+            separator = ''
+        separator += match.group()
+        position = match.end()
+    if text[position:]:
+        sentences.append((separator, text[position:]))
+    return sentences
+
+def _split_oversized(piece: str, max_tokens: int, encoding: Optional[tiktoken.Encoding]) -> List[str]:
+    """Cut a piece with no break in it into slices of at most max_tokens tokens."""
+    slices = []
+    while _count_tokens(piece, encoding) > max_tokens:
+        # Longest prefix that still fits
+        low, high = 1, len(piece) - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if _count_tokens(piece[:middle], encoding) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        slices.append(piece[:low])
+        piece = piece[low:]
+    if piece:
+        slices.append(piece)
+    return slices
 
 class GoogleDocsService:
-    def __init__(self, config: Dict[str, str]):
+    def __init__(self, config: Mapping[str, str]):
         self.config = config
+        self._refresh_lock = threading.Lock()
+        self._refresh_timer: Optional[threading.Timer] = None
         self.creds = self._get_credentials()
-        self.docs_service = build('docs', 'v1', credentials=self.creds)
-        self.drive_service = build('drive', 'v3', credentials=self.creds)
+        self._schedule_refresh()
+        # (body endIndex, revisionId) per document, maintained locally to avoid a
+        # documents().get() per append
+        self._doc_state: Dict[str, Tuple[int, str]] = {}
+        # googleapiclient is synchronous, so requests run on these threads to keep
+        # the event loop free. httplib2 connections are not thread-safe, hence one
+        # per thread.
+        self._executor = ThreadPoolExecutor(max_workers=DOCS_WORKERS, thread_name_prefix='google-docs')
+        self._thread_local = threading.local()
+
+    @functools.cached_property
+    def docs_service(self) -> Any:
+        return _build_service('docs', 'v1', self.creds)
+
+    @functools.cached_property
+    def drive_service(self) -> Any:
+        return _build_service('drive', 'v3', self.creds)
 
     def _get_credentials(self) -> Credentials:
         """Get or refresh Google API credentials."""
+        from google.auth.transport.requests import Request
+        from google.oauth2.credentials import Credentials
+        from google_auth_oauthlib.flow import InstalledAppFlow
+
         creds = None
         token_path = Path(self.config['TOKEN_JSON'])
         
-        logging.debug(f'Getting credentials from {token_path}')
+        logging.debug('Getting credentials from %s', token_path)
         if token_path.exists():
             creds = Credentials.from_authorized_user_file(str(token_path), SCOPES)
         
         if not creds or not creds.valid:
-            logging.debug(f'Token file does not exist: {token_path}')
+            logging.debug('Token file does not exist: %s', token_path)
             if creds and creds.expired and creds.refresh_token:
-                logging.debug(f'Cleaning text')
+                logging.debug('Refreshing expired token')
                 creds.refresh(Request())
             else:
-                logging.debug(f'Cleaning text')
+                logging.debug('Running OAuth flow')
                 flow = InstalledAppFlow.from_client_secrets_file(
                     self.config['CREDENTIALS_JSON'], SCOPES)
                 creds = flow.run_local_server(port=0)
                 
-            logging.debug(f'Writing token to {token_path}')
-            token_path.write_text(creds.to_json())
+            self._save_token(creds)
             
         return creds
 
-    def create_document(self, title: str) -> Dict[str, str]:
+    def _save_token(self, creds: Credentials) -> None:
+        """Persist credentials so the next run can reuse them."""
+        token_path = Path(self.config['TOKEN_JSON'])
+        logging.debug('Writing token to %s', token_path)
+        token_path.write_text(creds.to_json())
+
+    def _schedule_refresh(self) -> None:
+        """Refresh the access token in the background shortly before it expires.
+
+        Otherwise the first Docs call after expiry refreshes it synchronously,
+        stalling the pipeline partway through a long run.
+        """
+        if not self.creds.expiry or not self.creds.refresh_token:
+            return
+        # Credentials.expiry is a naive UTC datetime
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        delay = (self.creds.expiry - TOKEN_REFRESH_MARGIN - now).total_seconds()
+        self._refresh_timer = threading.Timer(max(delay, 0), self._refresh_credentials)
+        self._refresh_timer.daemon = True
+        self._refresh_timer.start()
+
+    def _refresh_credentials(self) -> None:
+        from google.auth.transport.requests import Request
+
+        with self._refresh_lock:
+            if self._refresh_timer is None:
+                # Closed while the timer was firing
+                return
+            try:
+                logging.debug('Refreshing token ahead of expiry')
+                self.creds.refresh(Request())
+                self._save_token(self.creds)
+            except Exception as e:
+                # Requests will still refresh on demand if the token does expire
+                logging.warning('Background token refresh failed: %s', e)
+                return
+            self._schedule_refresh()
+
+    def close(self) -> None:
+        """Stop the background token refresh and the request threads."""
+        with self._refresh_lock:
+            if self._refresh_timer is not None:
+                self._refresh_timer.cancel()
+                self._refresh_timer = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _execute(self, request: Any) -> Dict[str, Any]:
+        """Run a googleapiclient request on the executor, retrying transient failures."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._execute_in_thread, request)
+
+    def _execute_in_thread(self, request: Any) -> Dict[str, Any]:
+        http = getattr(self._thread_local, 'http', None)
+        if http is None:
+            import google_auth_httplib2
+            from googleapiclient.http import build_http
+
+            http = google_auth_httplib2.AuthorizedHttp(self.creds, http=build_http())
+            self._thread_local.http = http
+        return request.execute(http=http, num_retries=API_MAX_RETRIES)
+
+    async def create_document(self, title: str) -> Dict[str, str]:
         """Create a new Google Doc and return its ID and URL."""
-        doc = self.docs_service.documents().create(body={'title': title}).execute()
+        doc = await self._execute(self.docs_service.documents().create(body={'title': title}))
         doc_id = doc.get('documentId')
         doc_url = f"https://docs.google.com/document/d/{doc_id}/edit"
+        self._doc_state[doc_id] = (doc['body']['content'][-1]['endIndex'], doc['revisionId'])
         return {'id': doc_id, 'url': doc_url}
 
-    def append_text(self, doc_id: str, text: str) -> None:
-        """Append text to an existing Google Doc."""
-        document = self.docs_service.documents().get(documentId=doc_id).execute()
-        end_index = document['body']['content'][-1]['endIndex']
+    async def append_text(self, doc_id: str, text: str) -> None:
+        """Append text to an existing Google Doc.
+
+        Appends to the same document must not run concurrently.
+        """
+        # Strip what the API would drop so the locally tracked end index stays accurate.
+        # Popping the entry means a failed update forces a fresh lookup next time.
+        from googleapiclient.errors import HttpError
+
+        text = DOCS_STRIPPED_CHARS.sub('', text)
+        state = self._doc_state.pop(doc_id, None)
+        if state is None:
+            document = await self._execute(self.docs_service.documents().get(documentId=doc_id))
+            state = (document['body']['content'][-1]['endIndex'], document['revisionId'])
+        end_index, revision_id = state
 
         requests = [{
             'insertText': {
@@ -117,58 +531,224 @@ class GoogleDocsService:
             }
         }]
 
-        self.docs_service.documents().batchUpdate(
-            documentId=doc_id, 
-            body={'requests': requests}
-        ).execute()
-        logging.info(f'Appended text to Google Doc {doc_id}')
+        # Document indexes count UTF-16 code units
+        expected_end_index = end_index + len(text.encode('utf-16-le')) // 2
+
+        # Pinning the revision makes a retry of an update that actually went
+        # through fail instead of inserting the text twice
+        try:
+            response = await self._execute(self.docs_service.documents().batchUpdate(
+                documentId=doc_id, 
+                body={'requests': requests, 'writeControl': {'requiredRevisionId': revision_id}}
+            ))
+        except HttpError as e:
+            if e.resp.status != 400:
+                raise
+            # The failed attempt may be a retry of one that was applied, in which
+            # case the document already ends where this append would leave it
+            document = await self._execute(self.docs_service.documents().get(documentId=doc_id))
+            if document['body']['content'][-1]['endIndex'] != expected_end_index:
+                raise
+            self._doc_state[doc_id] = (expected_end_index, document['revisionId'])
+        else:
+            self._doc_state[doc_id] = (expected_end_index,
+                                       response['writeControl']['requiredRevisionId'])
+        logging.info('Appended text to Google Doc %s', doc_id)
+
+@functools.lru_cache(maxsize=4)
+def _discovery_document(service_name: str, version: str) -> str:
+    """Load the discovery document bundled with googleapiclient, once per process."""
+    from googleapiclient.discovery_cache import get_static_doc
+
+    return get_static_doc(service_name, version)
+
+def _build_service(service_name: str, version: str, credentials: Credentials) -> Any:
+    """Build a Google API client from the cached discovery document."""
+    from googleapiclient.discovery import build, build_from_document
+
+    document = _discovery_document(service_name, version)
+    if document is None:
+        return build(service_name, version, credentials=credentials)
+    return build_from_document(document, credentials=credentials)
 
 class AudioProcessor:
-    def __init__(self, config: Dict[str, str]):
-        self.openai_client = OpenAI(
+    """Transcribes, cleans and collects audio files into a Google Doc.
+
+    ``concurrency`` is a per-stage limit: the transcribe and clean stages each
+    run that many workers, so up to twice as many files can be in progress,
+    with up to ``concurrency`` more finished items waiting in each queue.
+    """
+
+    def __init__(
+        self,
+        config: Mapping[str, str],
+        concurrency: int = DEFAULT_CONCURRENCY,
+        use_cache: bool = True,
+        compress: bool = False
+    ):
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+        # One pooled client for all requests; with HTTP/2 (needs the h2 package)
+        # concurrent requests are multiplexed over a single connection.
+        http_client = DefaultAsyncHttpxClient(http2=importlib.util.find_spec('h2') is not None)
+        self.openai_client = AsyncOpenAI(
             organization=config['OPENAI_ORGANIZATION'],
             project=config['OPENAI_PROJECT'],
-            api_key=config['OPENAI_API_KEY']
+            api_key=config['OPENAI_API_KEY'],
+            http_client=http_client,
+            max_retries=API_MAX_RETRIES
         )
-        self.transcription_service = TranscriptionService(self.openai_client)
+        cache = TranscriptCache(config['CACHE_DIR']) if use_cache else None
+        self.transcription_service = TranscriptionService(
+            self.openai_client, config['GPT_CLEAN_MODEL'], cache, compress=compress)
         self.docs_service = GoogleDocsService(config)
+        self.concurrency = concurrency
+
+    async def aclose(self) -> None:
+        """Close the HTTP connection pool and stop background work."""
+        await self.openai_client.close()
+        self.docs_service.close()
+
+    async def __aenter__(self) -> AudioProcessor:
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
 
-    def process_files(
+    async def process_files(
         self, 
         files: List[str], 
         directory: str, 
-        output_title: str = None
+        output_title: str = None,
+        file_stats: Optional[Dict[str, os.stat_result]] = None
     ) -> List[ProcessingResult]:
-        """Process multiple audio files and create a Google Doc with transcriptions."""
+        """Process multiple audio files and create a Google Doc with transcriptions.
+
+        Files flow through a transcribe -> clean pipeline, so one file can be
+        transcribing while another is being cleaned. Each stage runs up to
+        ``concurrency`` workers, so up to 2 x ``concurrency`` files can be in
+        progress at once. Once every file is done, all transcriptions
+        are inserted into the document, in the order of ``files``, with a
+        single batchUpdate.
+
+        ``file_stats`` can carry stat results the caller already has, as
+        returned by ``stat_files``; otherwise the files are stat'ed here.
+        """
         if not output_title:
             output_title = datetime.datetime.now().strftime(DEFAULT_DATE_FORMAT)
 
+        # Everything that needs the filesystem happens here, before any API calls
+        metadata = await asyncio.to_thread(_collect_metadata, files, directory, file_stats)
+
         # Create Google Doc
-        doc_info = self.docs_service.create_document(output_title)
-        results = []
+        doc_info = await self.docs_service.create_document(output_title)
+        # Logged now so the document can be found even if a later step fails
+        logging.info('Created Google Doc %s', doc_info['url'])
 
-        for file in files:
-            file_path = os.path.join(directory, file)
-            file_stats = os.stat(file_path)
-            file_metadata = (f"{file} {datetime.datetime.fromtimestamp(file_stats.st_mtime).strftime(DEFAULT_DATE_FORMAT)}")
+        transcribe_q = asyncio.Queue()
+        clean_q = asyncio.Queue(maxsize=self.concurrency)
+        done_q = asyncio.Queue(maxsize=self.concurrency)
+        for index, (_, file_path, _) in enumerate(metadata):
+            transcribe_q.put_nowait((index, file_path))
+        transcribe_q.put_nowait(None)
+        clean_transcriptions = [None] * len(files)
 
-            # Process file
-            transcription = self.transcription_service.transcribe(file_path)
-            clean_transcription = self.transcription_service.clean_text(transcription)
-            
-            # Format and append to document
-            formatted_text = (f"{file_metadata}\n\n{clean_transcription}\n"
-                            f"{'---'}\n\n")
-            self.docs_service.append_text(doc_info['id'], formatted_text)
+        async def transcribe(index: int, file_path: str):
+            return index, await self.transcription_service.transcribe(file_path)
+
+        async def clean(index: int, transcription: str):
+            return index, await self.transcription_service.clean_text(transcription)
+
+        async def collector_worker() -> None:
+            # Items arrive in completion order; slot them back into file order.
+            while True:
+                item = await done_q.get()
+                if item is None:
+                    return
+                index, clean_transcription = item
+                clean_transcriptions[index] = clean_transcription
 
-            results.append(ProcessingResult(
+        await _gather_all(
+            _run_stage(transcribe, transcribe_q, clean_q, self.concurrency),
+            _run_stage(clean, clean_q, done_q, self.concurrency),
+            collector_worker()
+        )
+
+        # Format and append to document
+        await self.docs_service.append_text(doc_info['id'], ''.join([
+            f"{file} {modified}\n\n{clean_transcription}\n---\n\n"
+            for (file, _, modified), clean_transcription in zip(metadata, clean_transcriptions)
+        ]))
+
+        return [
+            ProcessingResult(
                 file=file,
                 transcription_text=clean_transcription,
                 doc_id=doc_info['id'],
                 doc_url=doc_info['url']
-            ))
+            )
+            for file, clean_transcription in zip(files, clean_transcriptions)
+        ]
+
+def _collect_metadata(
+    files: List[str],
+    directory: str,
+    file_stats: Optional[Dict[str, os.stat_result]] = None
+) -> List[Tuple[str, str, str]]:
+    """Return (file, path, formatted modification time) for each file, in order."""
+    if file_stats is None:
+        file_stats = stat_files(directory, files)
+    missing = [file for file in files if file not in file_stats]
+    if missing:
+        raise FileNotFoundError(f"Not found in {directory}: {', '.join(missing)}")
+    return [
+        (
+            file,
+            os.path.join(directory, file),
+            datetime.datetime.fromtimestamp(file_stats[file].st_mtime).strftime(DEFAULT_DATE_FORMAT)
+        )
+        for file in files
+    ]
+
+def stat_files(directory: str, files: List[str]) -> Dict[str, os.stat_result]:
+    """Stat files concurrently and return the results for those that are regular files."""
+    def safe_stat(file: str) -> Optional[os.stat_result]:
+        try:
+            return os.stat(os.path.join(directory, file))
+        except OSError:
+            return None
+
+    with ThreadPoolExecutor(max_workers=STAT_WORKERS) as executor:
+        results = list(executor.map(safe_stat, files))
+    return {
+        file: file_stat
+        for file, file_stat in zip(files, results)
+        if file_stat is not None and stat.S_ISREG(file_stat.st_mode)
+    }
+
+async def _gather_all(*aws):
+    """Like asyncio.gather, but cancels the remaining awaitables if one fails."""
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+async def _run_stage(handler, inbox: asyncio.Queue, outbox: asyncio.Queue, workers: int) -> None:
+    """Feed items from inbox through handler into outbox until a None sentinel arrives."""
+    async def worker():
+        while True:
+            item = await inbox.get()
+            if item is None:
+                # Put the sentinel back so sibling workers stop too
+                inbox.put_nowait(None)
+                return
+            await outbox.put(await handler(*item))
 
-        return results
+    await _gather_all(*[worker() for _ in range(workers)])
+    await outbox.put(None)
 
 def setup_logging(verbose: bool) -> None:
     """Configure logging based on verbosity level."""
@@ -191,6 +771,13 @@ def parse_arguments():
                       help='Output document name (default: current timestamp)')
     parser.add_argument('-v', '--verbose', action='store_true',
                       help='Enable verbose logging')
+    parser.add_argument('-c', '--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                      help=f'Workers per pipeline stage (transcribe, clean); up to twice this many '
+                           f'files are in progress at once (default: {DEFAULT_CONCURRENCY})')
+    parser.add_argument('--no-cache', action='store_true',
+                      help='Ignore and do not update cached transcriptions')
+    parser.add_argument('--compress', action='store_true',
+                      help='Transcode audio to Opus before upload (requires ffmpeg)')
     parser.add_argument('-e', '--env',
                       choices=['development', 'testing', 'production'],
                       default='development',
@@ -202,18 +789,22 @@ def main() -> int:
     args = parse_arguments()
     setup_logging(args.verbose)
 
-    logging.debug(f'args: {args}')
+    logging.debug('args: %s', args)
     # Validate directory
     if not os.path.isdir(args.directory):
-        logging.error(f"Directory does not exist: {args.directory}")
+        logging.error("Directory does not exist: %s", args.directory)
+        return 1
+
+    if args.concurrency < 1:
+        logging.error("Concurrency must be at least 1: %d", args.concurrency)
         return 1
 
     # Validate files
+    file_stats = stat_files(args.directory, args.files)
     files_to_process = []
     for file in args.files:
-        file_path = os.path.join(args.directory, file)
-        if not os.path.isfile(file_path):
-            logging.warning(f"File does not exist: {file_path}")
+        if file not in file_stats:
+            logging.warning("File does not exist: %s", os.path.join(args.directory, file))
             continue
         files_to_process.append(file)
 
@@ -223,22 +814,29 @@ def main() -> int:
 
     try:
         config = load_config(args.env)
-        processor = AudioProcessor(config)
-        results = processor.process_files(
-            files=files_to_process,
-            directory=args.directory,
-            output_title=args.output
-        )
+
+        async def run() -> List[ProcessingResult]:
+            async with AudioProcessor(config, concurrency=args.concurrency,
+                                      use_cache=not args.no_cache,
+                                      compress=args.compress) as processor:
+                return await processor.process_files(
+                    files=files_to_process,
+                    directory=args.directory,
+                    output_title=args.output,
+                    file_stats=file_stats
+                )
+
+        results = asyncio.run(run())
         
-        logging.info(f"Successfully processed {len(results)} files")
+        logging.info("Successfully processed %d files", len(results))
         for result in results:
-            logging.info(f"Processed file: {result.file}")
-            logging.info(f"Document URL: {result.doc_url}")
+            logging.info("Processed file: %s", result.file)
+            logging.info("Document URL: %s", result.doc_url)
         
         return 0
         
     except Exception as e:
-        logging.error(f"Error processing files: {str(e)}")
+        logging.error("Error processing files: %s", e)
         return 1
 
 if __name__ == "__main__":